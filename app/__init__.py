@@ -1,33 +1,114 @@
 import os
+import queue
+import uuid
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
+from flask_compress import Compress
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 import atexit
 from typing import Optional
 
+# Records are enqueued by the caller and written to the real handlers on a
+# background thread, so logging never blocks the scraper loops on I/O.
+os.makedirs("logs", exist_ok=True)
+_log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+_log_handlers = [logging.StreamHandler(), logging.FileHandler(os.path.join("logs", "scraper.log"), encoding="utf-8")]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # Final formatting happens in the listener
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        
-    ]
+    handlers=[_queue_handler]
 )
 
 db = SQLAlchemy()
-cache = Cache(config={'CACHE_TYPE': 'simple'})
+cache = Cache()
+compress = Compress()
+
+PRICE_UPDATE_JOB_ID = 'update_product_price'
+SCRAPE_STATUS_TIMEOUT = 3600
+_scheduler_app: Optional[Flask] = None
+_scheduler: Optional[BackgroundScheduler] = None
+
+def safe_update_product_price() -> None:
+    """Safely update product prices and log outcomes.
+
+    Defined at module level so the persistent job store can reference it by name.
+    """
+    from .scraper import update_product_price
+    from .database import clean_old_data
+    from .views import clear_brands_cache, clear_listing_cache, refresh_brand_counts
+
+    with _scheduler_app.app_context():
+        try:
+            update_product_price()
+            logging.info("Price update job completed successfully.")
+            # Clean old data after updating; removed products must drop out of
+            # cached listings, brands and counts just as save_to_db's additions appear
+            if clean_old_data():
+                clear_listing_cache()
+                clear_brands_cache()
+                refresh_brand_counts()
+        except Exception as e:
+            logging.error(f"Error during price update job: {str(e)}")
+
+def scrape_status_key(job_id: str) -> str:
+    return f"scrape:{job_id}"
+
+def safe_scrape_url(job_id: str, url: str) -> None:
+    """Run a user-requested scrape and record its result for the status endpoint."""
+    from .scraper import scrape_from_user_url
+
+    with _scheduler_app.app_context():
+        result = scrape_from_user_url(url)
+        cache.set(scrape_status_key(job_id), result, timeout=SCRAPE_STATUS_TIMEOUT)
+
+def enqueue_scrape(url: str) -> str:
+    """Schedule a scrape of ``url`` on the background scheduler and return its job id."""
+    job_id = uuid.uuid4().hex
+    cache.set(scrape_status_key(job_id), {"status": "pending", "message": "Scrape scheduled."}, timeout=SCRAPE_STATUS_TIMEOUT)
+    _scheduler.add_job(
+        func=safe_scrape_url,
+        id=job_id,
+        args=[job_id, url],
+        trigger='date',
+        misfire_grace_time=None
+    )
+    return job_id
 
 def create_app() -> Flask:
     """Initialize and configure the Flask application."""
     app = Flask(__name__, instance_relative_config=True)
+    db_uri = os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(app.instance_path, "flaskr.sqlite")}')
+    engine_options = {"pool_pre_ping": True}
+    if db_uri.startswith('sqlite'):
+        # "timeout" is sqlite3's busy timeout: how long a connection waits on a locked database
+        engine_options.update(connect_args={"check_same_thread": False, "timeout": 30}, pool_size=10)
+    elif make_url(db_uri).get_driver_name() == 'psycopg2':
+        # Bulk INSERTs already go out as multi-row VALUES; this also pages the
+        # bulk UPDATEs of the save and price-update paths through execute_batch
+        engine_options.update(executemany_mode='values_plus_batch', insertmanyvalues_page_size=1000)
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', os.urandom(24).hex()),
-        SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(app.instance_path, "flaskr.sqlite")}'),
+        SQLALCHEMY_DATABASE_URI=db_uri,
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        CACHE_TYPE='simple',
+        # Share cached data across workers when Redis is available
+        CACHE_TYPE='RedisCache' if os.environ.get('REDIS_URL') else 'SimpleCache',
+        CACHE_REDIS_URL=os.environ.get('REDIS_URL'),
         DEBUG=os.environ.get('FLASK_ENV', 'production') == 'development',
         PORT=int(os.environ.get('PORT', 5000))
     )
@@ -39,36 +120,55 @@ def create_app() -> Flask:
 
     db.init_app(app)
     cache.init_app(app)
+    compress.init_app(app)
 
     from .views import views_bp
     app.register_blueprint(views_bp)
 
     with app.app_context():
-        db.create_all()
+        if db_uri.startswith('sqlite') and ':memory:' not in db_uri:
+            @event.listens_for(db.engine, "connect")
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                """Enable WAL so the scheduler writer does not block request readers."""
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA temp_store=MEMORY")
+                cursor.execute("PRAGMA cache_size=-64000")
+                cursor.execute("PRAGMA mmap_size=268435456")
+                cursor.execute("PRAGMA wal_autocheckpoint=1000")
+                cursor.close()
 
-        scheduler = BackgroundScheduler()
-        from .scraper import update_product_price
-        from .database import clean_old_data
+        db.create_all()
+        from .database import ensure_indexes
+        ensure_indexes()
 
-        def safe_update_product_price():
-            """Safely update product prices and log outcomes."""
-            with app.app_context():
-                try:
-                    update_product_price()
-                    logging.info("Price update job completed successfully.")
-                    clean_old_data()  # Clean old data after updating
-                except Exception as e:
-                    logging.error(f"Error during price update job: {str(e)}")
+        global _scheduler_app, _scheduler
+        _scheduler_app = app
+        _scheduler = scheduler = BackgroundScheduler(jobstores={
+            'default': SQLAlchemyJobStore(url=db_uri)
+        })
 
         if not scheduler.running:
-            scheduler.add_job(
-                func=safe_update_product_price,
-                trigger='interval',
-                hours=24,
-                next_run_time=datetime.now(),
-                max_instances=1
-            )
-            scheduler.start()
+            # Paused until the stored job is reconciled, so an overdue run is not
+            # judged against options persisted by an older version
+            scheduler.start(paused=True)
+            # The job state lives in the database, so only register it once.
+            if scheduler.get_job(PRICE_UPDATE_JOB_ID) is not None:
+                scheduler.modify_job(PRICE_UPDATE_JOB_ID, misfire_grace_time=None, coalesce=True)
+            else:
+                scheduler.add_job(
+                    func=safe_update_product_price,
+                    id=PRICE_UPDATE_JOB_ID,
+                    trigger='interval',
+                    hours=24,
+                    next_run_time=datetime.now(),
+                    max_instances=1,
+                    coalesce=True,
+                    # Run overdue updates once on startup instead of dropping them as missed
+                    misfire_grace_time=None
+                )
+            scheduler.resume()
             atexit.register(lambda: scheduler.shutdown())
 
     return app
\ No newline at end of file
@@ -1,7 +1,12 @@
+import logging
 from . import db
 from datetime import datetime, timedelta
-from sqlalchemy import Numeric
-from typing import Optional
+from sqlalchemy import Numeric, delete, func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
 
 class ScrapedData(db.Model):
     __tablename__ = 'scraped_data'
@@ -11,10 +16,23 @@ class ScrapedData(db.Model):
     # prev_price = db.Column(Numeric(10, 2), nullable=True)
     link = db.Column(db.String(500), nullable=False, unique=True, index=True)
     image = db.Column(db.String(500), nullable=True)
-    brand = db.Column(db.String(100), nullable=True, index=True)
+    brand = db.Column(db.String(100), nullable=True)
     product_code = db.Column(db.String(100), nullable=True, index=True)
+    # Last time a scrape or price check saw the product; clean_old_data keys on it
     last_updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
-    prices = db.relationship('PriceHistory', backref='product', lazy='dynamic')
+    prices = db.relationship('PriceHistory', back_populates='product', lazy='select', order_by='PriceHistory.timestamp.desc()')
+
+    __table_args__ = (
+        db.Index('ix_scraped_last_updated_id', 'last_updated', 'id'),
+        db.Index('ix_scraped_title_lower', db.func.lower(title)),
+        # Matches brand_products' keyset order; on PostgreSQL the listing columns
+        # are included so pages come from an index-only scan
+        db.Index('ix_scraped_brand_id', brand, id.desc(),
+                 postgresql_include=['title', 'current_price', 'image', 'product_code']),
+        # Unbranded rows never appear in the brand list or counts
+        db.Index('ix_scraped_brand_notnull', brand,
+                 postgresql_where=brand.isnot(None), sqlite_where=brand.isnot(None)),
+    )
 
     def __repr__(self) -> str:
         return f"<ScrapedData {self.title}>"
@@ -22,21 +40,103 @@ class ScrapedData(db.Model):
 class PriceHistory(db.Model):
     __tablename__ = 'price_history'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('scraped_data.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('scraped_data.id'), nullable=False)
     price = db.Column(Numeric(10, 2), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    product = db.relationship('ScrapedData', back_populates='prices')
+
+    __table_args__ = (
+        # Serves a product's history already in display order; also covers product_id lookups
+        db.Index('ix_price_history_product_ts', product_id, timestamp.desc()),
+    )
 
     def __repr__(self) -> str:
         return f"<PriceHistory {self.price} at {self.timestamp}>"
 
-def clean_old_data(threshold_seconds: int = 3) -> None:
-    """Remove records older than the specified threshold."""
+# Indexes and views that only PostgreSQL can build; applied by ensure_indexes() on that backend.
+POSTGRES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_scraped_title_fts ON scraped_data USING gin (to_tsvector('simple', title))",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_scraped_title_trgm ON scraped_data USING gin (lower(title) gin_trgm_ops)",
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS brands_mv AS SELECT DISTINCT brand FROM scraped_data WHERE brand IS NOT NULL",
+    # Unique index required by REFRESH ... CONCURRENTLY
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_brands_mv_brand ON brands_mv (brand)",
+]
+
+def ensure_indexes() -> None:
+    """Create declared indexes that are missing from an existing database."""
+    with db.engine.begin() as conn:
+        for table in (ScrapedData.__table__, PriceHistory.__table__):
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        if conn.dialect.name == 'postgresql':
+            for statement in POSTGRES_INDEXES:
+                # An index the role may not create (e.g. pg_trgm) must not block startup
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(statement))
+                except SQLAlchemyError as e:
+                    logger.error(f"Failed to apply index DDL: {str(e)}")
+
+def distinct_brands() -> List[str]:
+    """Return every known brand.
+
+    PostgreSQL reads the small ``brands_mv`` materialized view; other backends
+    fall back to a DISTINCT over the products table.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return list(db.session.scalars(text("SELECT brand FROM brands_mv")))
+    return [b for b in db.session.scalars(select(ScrapedData.brand).where(ScrapedData.brand.isnot(None)).distinct()) if b]
+
+def brand_counts() -> Dict[str, int]:
+    """Return the number of products per brand."""
+    rows = db.session.execute(
+        select(ScrapedData.brand, func.count()).where(ScrapedData.brand.isnot(None)).group_by(ScrapedData.brand)
+    )
+    return dict(rows.all())
+
+def refresh_brands_view() -> None:
+    """Rebuild ``brands_mv`` after writes that may add brands (PostgreSQL only)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY brands_mv"))
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to refresh brands view: {str(e)}")
+
+def clean_old_data(threshold_days: int = 30, batch_size: int = 500) -> int:
+    """Remove products no scrape or price check has seen within the threshold, in short batches.
+
+    Returns the number of products deleted, including batches committed before an error.
+    """
+    deleted = 0
     try:
-        threshold = datetime.utcnow() - timedelta(seconds=threshold_seconds)
-        deleted = ScrapedData.query.filter(ScrapedData.last_updated < threshold).delete()
-        db.session.commit()
+        threshold = datetime.utcnow() - timedelta(days=threshold_days)
+        while True:
+            stale_ids = db.session.scalars(
+                select(ScrapedData.id).where(ScrapedData.last_updated < threshold).limit(batch_size)
+            ).all()
+            if not stale_ids:
+                break
+            # History rows reference the products, so they go first in the same transaction
+            db.session.execute(
+                delete(PriceHistory)
+                .where(PriceHistory.product_id.in_(stale_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                delete(ScrapedData)
+                .where(ScrapedData.id.in_(stale_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            deleted += len(stale_ids)
+            if len(stale_ids) < batch_size:
+                break
         if deleted:
-            print(f"Deleted {deleted} old records.")
+            logger.info(f"Deleted {deleted} old records.")
     except Exception as e:
         db.session.rollback()
-        print(f"Error cleaning old data: {str(e)}")
\ No newline at end of file
+        logger.exception(f"Error cleaning old data: {str(e)}")
+    return deleted
\ No newline at end of file
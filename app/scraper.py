@@ -1,27 +1,129 @@
-import json
+import orjson
 import os
+import gzip
+import asyncio
 import logging
 
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from lxml.etree import XPath, ParserError
+from lxml.html import HtmlElement
 import re
 from .database import ScrapedData, PriceHistory
-from . import db
+from . import db, cache
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import List, Optional, Dict, Any
+from flask import current_app
+from sqlalchemy import select, update
+from tenacity import AsyncRetrying, stop_after_attempt, wait_fixed
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 
-# Configure logging
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s - [Product: %(product)s, Link: %(link)s]",
-   
-)
+PRICE_UPDATE_WORKERS = int(os.environ.get('PRICE_UPDATE_WORKERS', 32))
+PAGE_FETCH_WORKERS = 8
+PRICE_UPDATE_TIMEOUT = 600  # Seconds to wait for the whole batch of price fetches
+SQLITE_MAX_PARAMS = 900  # Stay under SQLite's SQLITE_MAX_VARIABLE_NUMBER
+SAVE_BATCH_SIZE = 500
+
+def _chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Yield successive slices of at most ``size`` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+_BASE_URL = "https://www.dmo.gov.tr/"
+VALID_SCHEMES = ("http://", "https://")
+
+def _abs_url(url: str, base: str = _BASE_URL) -> str:
+    """Resolve ``url`` against ``base``, skipping urljoin for already absolute URLs."""
+    return url if url.startswith(VALID_SCHEMES) else urljoin(base, url)
+
+_PAGE_RE = re.compile(r"([?&]page=)(\d+)")
+_PRICE_TRANS = str.maketrans({".": "", ",": "."})
+_PRICE_RE = re.compile(r"[^\d.]")
+
+def _parse_price(price_text: str) -> Optional[float]:
+    """Parse and normalize price text."""
+    try:
+        price_clean = _PRICE_RE.sub("", price_text.translate(_PRICE_TRANS))
+        return float(price_clean) if price_clean else None
+    except (ValueError, AttributeError):
+        return None
+
+def _has_class(name: str) -> str:
+    """XPath predicate equivalent to the CSS class selector ``.name``."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Selectors are compiled once; lxml evaluates them in C on every page and product
+_XP_PRODUCTS = XPath(f"//*[{_has_class('product-item-holder')}]")
+_XP_TITLE_LINK = XPath(f".//*[{_has_class('title')}]//a")
+_XP_IMAGE = XPath(f".//*[{_has_class('image')}]//img")
+_XP_PRICE = XPath(f".//*[{_has_class('price-current')}]")
+_XP_BRAND = XPath(f".//*[{_has_class('brand')}]")
+_XP_CURRENT_PAGE = XPath(f"//*[{_has_class('pagination')}]//*[{_has_class('current')}]")
+_XP_PAGE_LINKS = XPath(f"//*[{_has_class('pagination')}]//a")
+
+def _first(xpath: XPath, el: HtmlElement) -> Optional[HtmlElement]:
+    """Return the first match of ``xpath`` under ``el``, like BeautifulSoup's select_one."""
+    matches = xpath(el)
+    return matches[0] if matches else None
+
+def _text(el: HtmlElement) -> str:
+    """Concatenate the stripped text nodes of ``el``, like get_text(strip=True)."""
+    return "".join(t.strip() for t in el.itertext())
+
+def _parse_html(content: bytes, encoding: Optional[str] = None) -> Optional[HtmlElement]:
+    """Parse an HTML document, returning None for empty or unparsable bodies.
+
+    ``encoding`` is the charset the server sent; without it lxml falls back to
+    the document's <meta charset>, or a Latin-1 guess when that is missing too.
+    """
+    try:
+        parser = lxml_html.HTMLParser(encoding=encoding) if encoding else None
+        return lxml_html.document_fromstring(content, parser=parser)
+    except (ParserError, ValueError, LookupError):
+        return None
+
+def _price_from_html(content: bytes, encoding: Optional[str] = None) -> Optional[float]:
+    """Extract the current price from a product detail page."""
+    root = _parse_html(content, encoding)
+    price_element = _first(_XP_PRICE, root) if root is not None else None
+    return _parse_price(_text(price_element)) if price_element is not None else None
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Shared HTTP session so keep-alive connections are reused across fetches and worker threads
+_SESSION = requests.Session()
+_SESSION.headers.update(_HEADERS)
+# pool_maxsize matches the page prefetch threads so concurrent fetches never discard pooled connections
+_adapter = HTTPAdapter(pool_maxsize=PAGE_FETCH_WORKERS, max_retries=Retry(total=3, backoff_factor=0.5))
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
+def _response_encoding(response: requests.Response) -> Optional[str]:
+    """Charset declared in Content-Type, or None to let lxml read the document's own.
+
+    requests reports ISO-8859-1 for any text/* response without a charset, which
+    would garble UTF-8 and Turkish pages, so that default is not trusted.
+    """
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        return response.encoding
+    return None
+
+@cache.memoize(timeout=60)
+def _get_html(url: str) -> Tuple[bytes, Optional[str]]:
+    """Fetch a page body and its encoding, memoized briefly to dedupe bursty requests for the same URL."""
+    response = _SESSION.get(url, timeout=10)
+    response.raise_for_status()
+    return response.content, _response_encoding(response)
 
 class Product:
+    __slots__ = ("title", "price", "prev_price", "link", "image", "brand", "product_code")
+
     def __init__(self, title: str, price: float, link: str, image: str, brand: str, product_code: str, prev_price: Optional[float] = None):
         self.title = title
         self.price = price
@@ -47,70 +149,87 @@ class ProductScraper:
     def __init__(self, start_url: str):
         self.start_url = start_url
         self.base_url = start_url.split('?')[0]
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        self.seen_links = set()
+        self.seen_links = set()  # Links already collected in this crawl
 
     def fetch_all_products(self) -> List[Product]:
-        """Fetch all products from the start URL, handling pagination."""
+        """Fetch all products from the start URL, handling pagination.
+
+        Every page up to the last one linked from the current pagination block
+        is fetched concurrently; pages are still processed strictly in order.
+        """
         all_products = []
-        url = self.start_url
-        page = 1
+        pending = [(1, self.start_url)]
 
-        while True:
-            logging.info(f"Scraping page {page}...", extra={'product': '', 'link': url})
-            try:
-                response = requests.get(url, headers=self.headers, timeout=10)
-                response.raise_for_status()
-            except requests.RequestException as e:
-                logging.error(f"Failed to load page {page}: {str(e)}", extra={'product': '', 'link': url})
-                break
-
-            soup = BeautifulSoup(response.text, "html.parser")
-            products = self._extract_products_from_soup(soup)
-            if not products:
-                logging.info("No products found on this page, stopping.", extra={'product': '', 'link': url})
-                break
-            all_products.extend(products)
-            logging.info(f"Found {len(products)} products on page {page}.", extra={'product': '', 'link': url})
-
-            next_page_url = self._get_next_page_url(soup, url)
-            if not next_page_url:
-                logging.info("No next page link found, stopping.", extra={'product': '', 'link': url})
-                break
-
-            url = next_page_url
-            page += 1
+        while pending:
+            contents = self._fetch_pages(pending)
+            for (page, url), content in zip(pending, contents):
+                if content is None:
+                    return all_products
+                root = _parse_html(*content)
+                products = self._extract_products(root) if root is not None else []
+                if not products:
+                    logging.info(f"No products found on {url}, stopping.")
+                    return all_products
+                all_products.extend(products)
+                logging.info(f"Found {len(products)} products on page {page}.")
+
+            pending = self._get_following_pages(root, url)
+            if not pending:
+                logging.info("No next page link found, stopping.")
 
         return all_products
 
-    def _get_next_page_url(self, soup: BeautifulSoup, current_url: str) -> Optional[str]:
-        """Extract the next page URL from pagination links."""
-        current_page_el = soup.select_one(".pagination .current")
-        if not current_page_el:
-            return None
+    def _fetch_pages(self, pages: List[Tuple[int, str]]) -> List[Optional[Tuple[bytes, Optional[str]]]]:
+        """Fetch listing pages concurrently, in order; a page that fails to load yields None."""
+        app = current_app._get_current_object()
+
+        def fetch(page_url: Tuple[int, str]) -> Optional[Tuple[bytes, Optional[str]]]:
+            page, url = page_url
+            logging.info(f"Scraping page {page}: {url}")
+            with app.app_context():  # _get_html is memoized through the app's cache
+                try:
+                    return _get_html(url)
+                except requests.RequestException as e:
+                    logging.error(f"Failed to load page {page}: {str(e)}")
+                    return None
+
+        if len(pages) == 1:
+            return [fetch(pages[0])]
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as executor:
+            return list(executor.map(fetch, pages))
+
+    def _get_following_pages(self, root: HtmlElement, current_url: str) -> List[Tuple[int, str]]:
+        """Return (page, url) pairs for every page after the current one up to the last linked page."""
+        current_page_el = _first(_XP_CURRENT_PAGE, root)
+        if current_page_el is None:
+            return []
 
         try:
-            current_page = int(current_page_el.get_text(strip=True))
+            current_page = int(_text(current_page_el))
         except ValueError:
-            logging.error("Invalid current page number, stopping.", extra={'product': '', 'link': current_url})
-            return None
+            logging.error(f"Invalid current page number on {current_url}, stopping.")
+            return []
 
-        pagination_links = soup.select(".pagination a")
-        for link in pagination_links:
-            try:
-                page_num = int(link.get_text(strip=True))
-                if page_num == current_page + 1:
-                    return urljoin(current_url, link.get("href"))
-            except ValueError:
-                continue
-        return None
+        # Page numbers come from the hrefs, so non-numeric anchors cost no exception
+        page_urls = {}
+        for link in _XP_PAGE_LINKS(root):
+            href = link.get("href") or ""
+            match = _PAGE_RE.search(href)
+            if match:
+                page_urls.setdefault(int(match.group(2)), _abs_url(href, current_url))
+        if not page_urls:
+            return []
+
+        template = next(iter(page_urls.values()))
+        return [
+            (page_num, page_urls.get(page_num) or _PAGE_RE.sub(rf"\g<1>{page_num}", template, count=1))
+            for page_num in range(current_page + 1, max(page_urls) + 1)
+        ]
 
-    def _extract_products_from_soup(self, soup: BeautifulSoup) -> List[Product]:
-        """Extract product details from the page's soup object."""
+    def _extract_products(self, root: HtmlElement) -> List[Product]:
+        """Extract product details from the parsed page."""
         products = []
-        product_elements = soup.select(".product-item-holder")
+        product_elements = _XP_PRODUCTS(root)
         for el in product_elements:
             try:
                 product = self._parse_product_element(el)
@@ -118,150 +237,205 @@ class ProductScraper:
                     self.seen_links.add(product.link)
                     products.append(product)
                 else:
-                    logging.warning(f"Skipping product due to invalid data.", extra={'product': product.title if product else '', 'link': product.link if product else ''})
+                    logging.warning(f"Skipping product due to invalid data: {product.link if product else '-'}")
             except Exception as e:
-                logging.warning(f"Error parsing product: {str(e)}", extra={'product': '', 'link': ''})
+                logging.warning(f"Error parsing product: {str(e)}")
         return products
 
-    def _parse_product_element(self, el: BeautifulSoup) -> Optional[Product]:
+    def _parse_product_element(self, el: HtmlElement) -> Optional[Product]:
         """Parse a single product element."""
-        title_el = el.select_one(".title a")
-        if not title_el:
+        title_el = _first(_XP_TITLE_LINK, el)
+        if title_el is None:
             return None
-        title = title_el.get_text(strip=True) or "Unknown"
-        link = urljoin("https://www.dmo.gov.tr/", title_el.get("href") or "")
+        title = _text(title_el) or "Unknown"
+        link = _abs_url(title_el.get("href") or "")
 
-        image_el = el.select_one(".image img")
-        image = urljoin("https://www.dmo.gov.tr/", image_el.get("src") or "/static/images/no-image.jpg")
+        image_el = _first(_XP_IMAGE, el)
+        image = _abs_url(image_el.get("src") or "/static/images/no-image.jpg")
 
-        price_el = el.select_one(".price-current")
-        price_text = price_el.get_text(strip=True) if price_el else None
-        price = self._parse_price(price_text) if price_text else None
+        price_el = _first(_XP_PRICE, el)
+        price = _parse_price(_text(price_el)) if price_el is not None else None
 
-        brand_el = el.select_one(".brand")
-        brand_parts = brand_el.get_text(strip=True).split() if brand_el else []
+        brand_el = _first(_XP_BRAND, el)
+        span = brand_el.find(".//span") if brand_el is not None else None
+        product_code = _text(span) if span is not None else "-"
+        # The brand is the element's own leading text; the code lives in the <span>
+        brand_parts = (brand_el.text or "").split() if brand_el is not None else []
         brand = brand_parts[0] if brand_parts else "Unknown"
-        product_code = brand_el.select_one("span").get_text(strip=True) if brand_el and brand_el.select_one("span") else "-"
 
         return Product(title, price, link, image, brand, product_code) if price else None
 
-    def _parse_price(self, price_text: str) -> Optional[float]:
-        """Parse and normalize price text."""
-        try:
-            price_normalized = price_text.replace(".", "").replace(",", ".")
-            price_clean = re.sub(r"[^\d.]", "", price_normalized)
-            return float(price_clean) if price_clean else None
-        except (ValueError, AttributeError):
-            return None
+async def _fetch_price_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, link: str) -> Optional[float]:
+    """Fetch the current price of a single product page."""
+    async for attempt in AsyncRetrying(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True):
+        with attempt:
+            async with semaphore, session.get(link) as response:
+                response.raise_for_status()
+                content = await response.read()
+                encoding = response.charset
+    return _price_from_html(content, encoding)
 
-class ProductPriceUpdater:
-    def __init__(self, product: Product):
-        self.product = product
-        self.link = product.link
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+async def _fetch_prices(rows: List[Any]) -> List[Tuple[Any, float]]:
+    """Fetch current prices for ``rows`` concurrently on one event loop.
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    def fetch_current_price(self) -> Optional[float]:
-        """Fetch the current price of a product."""
-        try:
-            response = requests.get(self.link, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            price_element = soup.select_one(".price-current")
-            price_text = price_element.get_text(strip=True) if price_element else None
-            logging.info(f"Raw price text (update): {price_text}", extra={'product': self.product.title, 'link': self.link})
-
-            return ProductScraper(self.link)._parse_price(price_text)
-        except requests.RequestException as e:
-            logging.error(f"Error fetching price: {str(e)}", extra={'product': self.product.title, 'link': self.link})
-            raise
-
-    def update_product_price(self) -> Optional[float]:
-        """Update the product price and return the new price."""
-        current_price = self.fetch_current_price()
-        prev_price = self.product.price
-        if current_price is None or prev_price == current_price:
-            logging.info(f"No price change.", extra={'product': self.product.title, 'link': self.link})
-            return None
+    Returns ``(row, price)`` pairs for every fetch that completed in time.
+    """
+    connector = aiohttp.TCPConnector(limit=PRICE_UPDATE_WORKERS, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=10)
+    results = []
+    async with aiohttp.ClientSession(headers=_HEADERS, connector=connector, timeout=timeout) as session:
+        semaphore = asyncio.Semaphore(PRICE_UPDATE_WORKERS)
+        tasks = {asyncio.ensure_future(_fetch_price_async(session, semaphore, row.link)): row for row in rows}
+        if not tasks:
+            return results
+        done, pending = await asyncio.wait(tasks, timeout=PRICE_UPDATE_TIMEOUT)
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logging.warning(f"Price update timed out; {len(pending)} fetches cancelled.")
 
-        self.product.price = current_price
-        self.product.prev_price = prev_price
-        logging.info(f"Price updated. New price: {current_price}", extra={'product': self.product.title, 'link': self.link})
-        return current_price
+        for task in done:
+            row = tasks[task]
+            if task.exception() is not None:
+                logging.warning(f"Skipping price update for {row.link}: {str(task.exception())}")
+                continue
+            if task.result() is not None:
+                results.append((row, task.result()))
+    return results
+
+def _mark_seen(ids: List[int], now: datetime) -> None:
+    """Stamp ``last_updated`` on products fetched with an unchanged price.
+
+    Cleanup removes products by ``last_updated``, so it must mean "last seen",
+    not "last repriced", or stable-priced products would be deleted.
+    """
+    for chunk in _chunked(ids, SQLITE_MAX_PARAMS):
+        db.session.execute(
+            update(ScrapedData)
+            .where(ScrapedData.id.in_(chunk))
+            .values(last_updated=now)
+            .execution_options(synchronize_session=False)
+        )
 
 def update_product_price() -> None:
-    """Update prices for all products in the database."""
-    products = ScrapedData.query.all()
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(ProductPriceUpdater(Product(
-            title=p.title,
-            price=p.current_price,
-            link=p.link,
-            image=p.image,
-            brand=p.brand,
-            product_code=p.product_code,
-            prev_price=p.prev_price
-        )).update_product_price) for p in products]
-        for future in futures:
-            future.result()  # Wait for completion
+    """Update prices for all products in the database.
+
+    Prices are fetched concurrently on an asyncio event loop; all database
+    writes happen afterwards on the calling thread, which owns the scoped session.
+    """
+    rows = db.session.execute(
+        select(ScrapedData.id, ScrapedData.link, ScrapedData.current_price, ScrapedData.title)
+    ).all()
+    now = datetime.utcnow()
+    updates = []
+    price_histories = []
+    unchanged_ids = []
+    for row, new_price in asyncio.run(_fetch_prices(rows)):
+        if new_price == float(row.current_price):
+            unchanged_ids.append(row.id)
+            continue
+        updates.append({"id": row.id, "current_price": new_price, "last_updated": now})
+        price_histories.append(PriceHistory(product_id=row.id, price=row.current_price, timestamp=now))
+
+    _mark_seen(unchanged_ids, now)
+    if updates:
+        db.session.execute(update(ScrapedData), updates)
+        db.session.bulk_save_objects(price_histories)
+    db.session.commit()
+    if not updates:
+        return
+    from .views import clear_listing_cache
+    clear_listing_cache()
+    logging.info(f"Updated prices for {len(updates)} products.")
 
 class ProductSaver:
-    def __init__(self, filename: str = "products.json"):
+    def __init__(self, filename: str = "products.json.gz"):
         self.filename = filename
 
     def save_to_json(self, products: List[Product]) -> None:
-        """Save products to a JSON file."""
+        """Save products to a JSON file, gzip-compressed when the filename ends in ``.gz``."""
         try:
             file_path = os.path.join("data_files", self.filename)
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump([p.to_dict() for p in products], f, ensure_ascii=False)
-            logging.info(f"{len(products)} products saved to {self.filename}", extra={'product': '', 'link': ''})
+            payload = orjson.dumps(products, default=Product.to_dict)
+            opener = gzip.open(file_path, "wb", compresslevel=1) if file_path.endswith(".gz") else open(file_path, "wb")
+            with opener as f:
+                f.write(payload)
+            logging.info(f"{len(products)} products saved to {self.filename}")
         except Exception as e:
-            logging.error(f"Error saving to JSON: {str(e)}", extra={'product': '', 'link': ''})
+            logging.error(f"Error saving to JSON: {str(e)}")
 
     def save_to_db(self, products: List[Product]) -> None:
         """Save products and their price histories to the database."""
         try:
+            now = datetime.utcnow()
             new_products = []
+            price_updates = []
             price_histories = []
+            unchanged_ids = []
+            all_links = [p.link for p in products if p.price is not None]
+            existing = {}
+            for chunk in _chunked(all_links, SQLITE_MAX_PARAMS):
+                rows = db.session.execute(
+                    select(ScrapedData.id, ScrapedData.link, ScrapedData.current_price)
+                    .where(ScrapedData.link.in_(chunk))
+                ).all()
+                existing.update((row.link, row) for row in rows)
+
             for product in products:
                 if product.price is None:
-                    logging.warning(f"Skipping product due to invalid price: {product.title}", extra={'product': product.title, 'link': product.link})
+                    logging.warning(f"Skipping product due to invalid price: {product.title} ({product.link})")
                     continue
-                existing_product = ScrapedData.query.filter_by(link=product.link).first()
+                existing_product = existing.get(product.link)
                 if existing_product:
-                    if existing_product.current_price != product.price:
-                        price_histories.append(
-                            PriceHistory(
-                                product_id=existing_product.id,
-                                price=existing_product.current_price
-                            )
-                        )
-                        existing_product.current_price = product.price
-                        existing_product.prev_price = existing_product.current_price
-                        existing_product.last_updated = datetime.utcnow()
+                    if float(existing_product.current_price) != product.price:
+                        price_histories.append({
+                            "product_id": existing_product.id,
+                            "price": existing_product.current_price,
+                            "timestamp": now
+                        })
+                        price_updates.append({
+                            "id": existing_product.id,
+                            "current_price": product.price,
+                            "last_updated": now
+                        })
+                    else:
+                        unchanged_ids.append(existing_product.id)
                 else:
-                    new_products.append(
-                        ScrapedData(
-                            title=product.title,
-                            current_price=product.price,
-                            prev_price=product.prev_price,
-                            link=product.link,
-                            image=product.image,
-                            brand=product.brand,
-                            product_code=product.product_code,
-                            last_updated=datetime.utcnow()
-                        )
-                    )
-            db.session.add_all(new_products + price_histories)
+                    new_products.append({
+                        "title": product.title,
+                        "current_price": product.price,
+                        "link": product.link,
+                        "image": product.image,
+                        "brand": product.brand,
+                        "product_code": product.product_code,
+                        "last_updated": now
+                    })
+            _mark_seen(unchanged_ids, now)
             db.session.commit()
-            logging.info(f"Saved {len(new_products)} new products and {len(price_histories)} price histories to database.", extra={'product': '', 'link': ''})
+            # Short transactions let readers see progress and keep the WAL small
+            for chunk in _chunked(price_updates, SAVE_BATCH_SIZE):
+                db.session.bulk_update_mappings(ScrapedData, chunk)
+                db.session.commit()
+            for chunk in _chunked(new_products, SAVE_BATCH_SIZE):
+                db.session.bulk_insert_mappings(ScrapedData, chunk)
+                db.session.commit()
+            for chunk in _chunked(price_histories, SAVE_BATCH_SIZE):
+                db.session.bulk_insert_mappings(PriceHistory, chunk)
+                db.session.commit()
+            from .views import get_brands, clear_brands_cache, clear_listing_cache, refresh_brand_counts
+            if price_updates or new_products:
+                clear_listing_cache()
+            if new_products:
+                refresh_brand_counts()
+            new_brands = {p["brand"] for p in new_products}
+            if new_brands and not new_brands <= set(get_brands()):
+                clear_brands_cache()
+            logging.info(f"Saved {len(new_products)} new products and {len(price_histories)} price histories to database.")
         except Exception as e:
             db.session.rollback()
-            logging.error(f"Error saving to database: {str(e)}", extra={'product': '', 'link': ''})
+            logging.error(f"Error saving to database: {str(e)}")
 
 def scrape_from_user_url(url: str) -> Dict[str, str]:
     """Scrape products from the given URL and save them."""
@@ -273,5 +447,5 @@ def scrape_from_user_url(url: str) -> Dict[str, str]:
         saver.save_to_db(products)
         return {"status": "success", "message": f"{len(products)} products scraped and saved successfully."}
     except Exception as e:
-        logging.error(f"Error processing URL {url}: {str(e)}", extra={'product': '', 'link': url})
+        logging.error(f"Error processing URL {url}: {str(e)}")
         return {"status": "error", "message": f"Error: {str(e)}"}
\ No newline at end of file
@@ -1,62 +1,216 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
-from .database import ScrapedData, PriceHistory
-from .scraper import scrape_from_user_url
-from markupsafe import escape
-from . import cache
-from typing import List, Optional
+import hashlib
+import time
+from flask import Blueprint, Response, render_template, request, flash, redirect, url_for, jsonify, make_response
+from .database import ScrapedData, brand_counts, distinct_brands, refresh_brands_view
+from .scraper import VALID_SCHEMES
+from markupsafe import Markup
+from flask_caching.backends import RedisCache
+from . import db, cache, enqueue_scrape, scrape_status_key
+from sqlalchemy import Select, func, literal_column, or_, select
+from sqlalchemy.orm import joinedload, load_only, raiseload
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from werkzeug.http import generate_etag, is_resource_modified
 
 views_bp = Blueprint('views', __name__)
 
-@cache.cached(timeout=3600, key_prefix='brands')
+BRANDS_VERSION_KEY = 'brands_ver'
+
+def bump_cache_version(key: str) -> None:
+    """Advance a version counter used in cache keys.
+
+    Counters are stored without expiry: if one lapsed, readers would fall back
+    to ``v0`` and could be served an entry cached long before the last bump.
+    """
+    cache.add(key, 0, timeout=0)
+    version = cache.cache.inc(key)  # Atomic INCR on Redis, which keeps the key persistent
+    if not isinstance(cache.cache, RedisCache):
+        # The generic inc() re-sets the key with the default timeout
+        cache.set(key, version, timeout=0)
+
+def brands_cache_key() -> str:
+    """Current versioned cache key for the brands list."""
+    return f"brands:v{cache.get(BRANDS_VERSION_KEY) or 0}"
+
+@cache.cached(timeout=86400, key_prefix=brands_cache_key)
+def _cached_brands() -> List[str]:
+    return distinct_brands()
+
+# Per-process copy in front of the shared cache: (expires_at, brands)
+BRANDS_LOCAL_TTL = 10
+_local_brands: Optional[Tuple[float, List[str]]] = None
+
 def get_brands() -> List[str]:
-    """Retrieve distinct brands from the database."""
-    brands = ScrapedData.query.with_entities(ScrapedData.brand).distinct().all()
-    return [b[0] for b in brands if b[0]]
+    """Retrieve distinct brands, skipping the shared cache while the local copy is fresh."""
+    global _local_brands
+    now = time.monotonic()
+    if _local_brands is None or _local_brands[0] <= now:
+        _local_brands = (now + BRANDS_LOCAL_TTL, _cached_brands())
+    return _local_brands[1]
+
+BRAND_COUNTS_KEY = 'brand_counts'
+
+def get_brand_counts() -> Dict[str, int]:
+    """Product count per brand for the brand filter, computed on a cache miss."""
+    counts = cache.get(BRAND_COUNTS_KEY)
+    if counts is None:
+        counts = refresh_brand_counts()
+    return counts
+
+def refresh_brand_counts() -> Dict[str, int]:
+    """Recompute the per-brand product counts after products are added or removed."""
+    counts = brand_counts()
+    cache.set(BRAND_COUNTS_KEY, counts, timeout=86400)
+    return counts
+
+# Inlined rather than bound so the expression matches the functional index exactly
+_TS_CONFIG = literal_column("'simple'")
+
+def title_matches(search: str):
+    """Title search filter that can be served by an index.
+
+    The base match is a case-insensitive substring test on ``lower(title)``, so
+    partial words, brands and SKUs are found; PostgreSQL serves it from the
+    ``pg_trgm`` index on that expression. On PostgreSQL it is OR-ed with a
+    full-text match on the ``to_tsvector('simple', title)`` GIN index, which
+    also finds the search words in any order; the planner combines both indexes.
+    """
+    substring = func.lower(ScrapedData.title).like(func.lower(f'%{search}%'))
+    if db.engine.dialect.name == 'postgresql':
+        full_text = func.to_tsvector(_TS_CONFIG, ScrapedData.title).op('@@')(func.plainto_tsquery(_TS_CONFIG, search))
+        return or_(full_text, substring)
+    return substring
+
+# Columns rendered by the listing template; the rest stay unloaded
+LISTING_COLUMNS = (
+    ScrapedData.id,
+    ScrapedData.title,
+    ScrapedData.current_price,
+    ScrapedData.image,
+    ScrapedData.brand,
+    ScrapedData.product_code,
+)
+
+class ListArgs(NamedTuple):
+    after_id: Optional[int]
+    per_page: int
+    search: str
+    brand: str
+    toggle_view: str
+
+def _parse_list_args(brand: Optional[str] = None) -> ListArgs:
+    """Parse the listing query parameters shared by the list views.
+
+    Values are left unescaped: Jinja autoescapes them on render.
+    """
+    return ListArgs(
+        after_id=request.args.get('after_id', type=int),
+        per_page=max(1, min(request.args.get('per_page', 10, type=int), 100)),  # Keep per_page within 1..100
+        search=request.args.get('search', '', type=str).strip(),
+        brand=(request.args.get('brand', '', type=str) if brand is None else brand).strip(),
+        toggle_view=request.args.get('toggleView', 'disabled')
+    )
+
+class KeysetPage(NamedTuple):
+    items: List[ScrapedData]
+    has_next: bool
+    next_after_id: Optional[int]
+
+def keyset_page(stmt: Select, after_id: Optional[int], per_page: int) -> KeysetPage:
+    """Fetch the page of rows with id below ``after_id``, newest first, without OFFSET or COUNT."""
+    if after_id:
+        stmt = stmt.where(ScrapedData.id < after_id)
+    # The listing never renders price history; fail loudly instead of lazy loading it per row
+    stmt = stmt.options(raiseload(ScrapedData.prices), load_only(*LISTING_COLUMNS))
+    stmt = stmt.order_by(ScrapedData.id.desc()).limit(per_page + 1)
+    rows = db.session.scalars(stmt).all()
+    items = rows[:per_page]
+    has_next = len(rows) > per_page
+    return KeysetPage(items, has_next, items[-1].id if has_next else None)
+
+LISTING_VERSION_KEY = 'listing_ver'
+LISTING_CACHE_TIMEOUT = 120
+
+def render_listing(stmt: Select, args: ListArgs) -> Markup:
+    """Render the product table and pagination, cached per query string.
+
+    The key carries the listing version so a single bump invalidates every page.
+    """
+    # Hash the arguments: joining raw user input would let distinct queries collide
+    # (brand 'a', search 'b:c' vs brand 'a:b', search 'c') and leave the key unbounded
+    digest = hashlib.sha1(repr(tuple(args)).encode()).hexdigest()
+    key = f"listing:v{cache.get(LISTING_VERSION_KEY) or 0}:{digest}"
+    html = cache.get(key)
+    if html is None:
+        html = render_template('listing.html', products=keyset_page(stmt, args.after_id, args.per_page), **args._asdict())
+        cache.set(key, html, timeout=LISTING_CACHE_TIMEOUT)
+    return Markup(html)
+
+def conditional_response(etag: str, render: Callable[[], str], last_modified: Optional[datetime] = None) -> Response:
+    """Answer 304 when the client's copy is current; otherwise render the page.
+
+    The ETag is weak so it stays valid for every compressed encoding of the body.
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response(render())
+    else:
+        response = make_response('', 304)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def clear_listing_cache() -> None:
+    """Invalidate every cached listing page by bumping its key version."""
+    bump_cache_version(LISTING_VERSION_KEY)
 
 def clear_brands_cache() -> None:
-    """Clear the brands cache."""
-    cache.delete('brands')
+    """Invalidate the brands cache by bumping its key version.
+
+    Readers switch to the new key atomically; the old entry simply expires.
+    Other processes pick it up once their local copy ages out.
+    """
+    global _local_brands
+    refresh_brands_view()
+    bump_cache_version(BRANDS_VERSION_KEY)
+    _local_brands = None
 
 @views_bp.route('/', methods=['GET', 'POST'])
 def home():
     """Handle the homepage with product listing and URL scraping."""
     if request.method == 'POST':
         url = request.form.get('scrape_url', '').strip()
-        if not url.startswith(('http://', 'https://')):
+        if not url.startswith(VALID_SCHEMES):
             flash('Invalid URL provided.', 'danger')
             return redirect(url_for('views.home'))
         try:
-            result = scrape_from_user_url(url)
-            clear_brands_cache()
-            flash(result['message'], 'success' if result['status'] == 'success' else 'danger')
+            job_id = enqueue_scrape(url)
+            flash(f'Scrape scheduled (job {job_id}).', 'success')
         except Exception as e:
             flash(f'Error processing URL: {str(e)}', 'danger')
         return redirect(url_for('views.home'))
 
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)  # Limit max per_page
-    search = escape(request.args.get('search', '', type=str).strip())
-    brand = escape(request.args.get('brand', '', type=str).strip())
-    toggle_view = request.args.get('toggleView', 'disabled')
-
-    query = ScrapedData.query
-    if search:
-        query = query.filter(ScrapedData.title.ilike(f'%{search}%'))
-    if brand:
-        query = query.filter(ScrapedData.brand == brand)
-
-    products = query.select_from(ScrapedData).paginate(page=page, per_page=per_page, error_out=False)
-    brands = get_brands()
-
-    return render_template(
-        'index.html',
-        products=products,
-        brands=brands,
-        search=search,
-        brand=brand,
-        per_page=per_page,
-        toggle_view=toggle_view
-    )
+    args = _parse_list_args()
+    stmt = select(ScrapedData)
+    if args.search:
+        stmt = stmt.where(title_matches(args.search))
+    if args.brand:
+        stmt = stmt.where(ScrapedData.brand == args.brand)
+
+    return render_template('index.html', listing=render_listing(stmt, args), brands=get_brands(),
+                           brand_counts=get_brand_counts(), **args._asdict())
+
+@views_bp.route('/scrape/<string:job_id>')
+def scrape_status(job_id: str):
+    """Report the status of a scheduled scrape as JSON."""
+    status = cache.get(scrape_status_key(job_id))
+    if status is None:
+        response = jsonify({"status": "unknown", "message": "No such scrape job."})
+        response.status_code = 404
+    else:
+        response = jsonify(status)
+    response.cache_control.no_store = True  # Polled until the job finishes
+    return response
 
 @views_bp.route('/toggle_view', methods=['POST'])
 def toggle_view():
@@ -74,32 +228,31 @@ def toggle_view():
 @views_bp.route('/product/<int:id>')
 def product_detail(id: int):
     """Display product details and price history."""
-    product = ScrapedData.query.get_or_404(id)
-    price_history = PriceHistory.query.filter_by(product_id=id).order_by(PriceHistory.timestamp.desc()).all()
-    return render_template('product_detail.html', product=product, price_history=price_history)
+    # Product and its history (newest first, per the relationship order) in one query
+    product = ScrapedData.query.options(joinedload(ScrapedData.prices)).filter_by(id=id).first_or_404()
+    # Price changes always touch last_updated, so it versions the whole page
+    return conditional_response(
+        generate_etag(f"{product.id}:{product.last_updated.isoformat()}".encode()),
+        lambda: render_template('product_detail.html', product=product, price_history=product.prices),
+        last_modified=product.last_updated
+    )
 
 @views_bp.route('/brand/<string:brand>')
 def brand_products(brand: str):
     """Display products filtered by brand."""
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
-    search = escape(request.args.get('search', '', type=str).strip())
-    brand = escape(brand.strip())
-    toggle_view = request.args.get('toggleView', 'disabled')
-
-    query = ScrapedData.query.filter_by(brand=brand)
-    if search:
-        query = query.filter(ScrapedData.title.ilike(f'%{search}%'))
-
-    products = query.paginate(page=page, per_page=per_page, error_out=False)
-    brands = get_brands()
-
-    return render_template(
-        'index.html',
-        products=products,
-        brands=brands,
-        search=search,
-        brand=brand,
-        per_page=per_page,
-        toggle_view=toggle_view
-    )
\ No newline at end of file
+    args = _parse_list_args(brand)
+
+    def render() -> str:
+        stmt = select(ScrapedData).where(ScrapedData.brand == args.brand)
+        if args.search:
+            stmt = stmt.where(title_matches(args.search))
+        return render_template('index.html', listing=render_listing(stmt, args), brands=get_brands(),
+                           brand_counts=get_brand_counts(), **args._asdict())
+
+    # The page only changes when the listing or brands are invalidated; the time
+    # bucket bounds staleness when each worker keeps its own cache versions
+    etag = generate_etag(
+        f"{cache.get(LISTING_VERSION_KEY) or 0}:{cache.get(BRANDS_VERSION_KEY) or 0}:"
+        f"{int(time.time() // LISTING_CACHE_TIMEOUT)}:{request.full_path}".encode()
+    )
+    return conditional_response(etag, render)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = 'gthread'
+# create_app() starts the APScheduler jobs in-process and schedulers must not
+# share a job store, so scale with threads rather than worker processes.
+workers = 1
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 60
+accesslog = '-'
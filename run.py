@@ -1,14 +1,25 @@
-from flask import Flask
+from flask import Flask, request, session
 from app import create_app
 
 app = create_app()
 
 @app.after_request
 def add_cache_headers(response):
-    """Add cache-control headers for non-HTML responses."""
+    """Add cache-control headers: long-lived for assets, short with SWR for public HTML."""
+    # Writes and pages that consume flashed messages are per-user
+    if request.method not in ('GET', 'HEAD') or session.modified:
+        response.cache_control.no_store = True
+        return response
+    if response.cache_control.no_store:
+        return response
     if 'Content-Type' in response.headers and 'text/html' not in response.headers['Content-Type']:
         response.cache_control.max_age = 604800  # 7 days
+    elif response.status_code in (200, 304):
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        response.cache_control.stale_while_revalidate = 300
     return response
 
 if __name__ == '__main__':
+    # Development server only; production runs wsgi:app under gunicorn (see gunicorn_conf.py)
     app.run(debug=app.config.get('DEBUG', False), host='0.0.0.0', port=app.config.get('PORT', 5000))
\ No newline at end of file
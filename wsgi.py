@@ -0,0 +1,4 @@
+"""Production entry point: gunicorn -c gunicorn_conf.py wsgi:app"""
+from run import app
+
+__all__ = ['app']